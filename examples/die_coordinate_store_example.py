@@ -0,0 +1,22 @@
+import numpy as np
+import iopgdstoolkit as iop
+
+# example 1
+# lay out markers for a 20 x 20 grid of dies, streaming the marker positions of each die straight into an
+# on-disk coordinate store, then read back the positions of a single die.
+
+bounds = ((ii * 1000, jj * 1000, ii * 1000 + 300, jj * 1000 + 300) for ii in range(0, 20) for jj in range(0, 20))
+die_ids = ((ii, jj) for ii in range(0, 20) for jj in range(0, 20))
+
+store = iop.DieCoordinateStore('die_coordinate_store_example')
+if (19, 19) not in store:
+    # ^ dies can only be added once, so re-running the example just reads the existing store
+    marker_stream = iop.layout_marker_stream(bounds)
+    store.add_dies((die_id, marker_list)
+                   for die_id, (marker, marker_list, marker_overlay) in zip(die_ids, marker_stream))
+
+print(
+    "Example 1:"
+    + "\nnumber of dies = " + str(len(store))
+    + "\nmarker positions of die (3, 4) = \n" + str(np.array(store[(3, 4)]))
+)
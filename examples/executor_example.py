@@ -0,0 +1,22 @@
+import iopgdstoolkit as iop
+from concurrent.futures import ThreadPoolExecutor
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# run the independent pieces of each call (marker corners, text labels) on a thread pool.
+# results are identical to running without one, only the final merge is done serially.
+
+iop.EXECUTOR = ThreadPoolExecutor()
+
+markers, marker_list, marker_overlay = iop.layout_marker((0, 0, 200, 200))
+global_labels = iop.label_global_positions(marker_list)
+
+cell = Cell('executor_example')
+cell.add_to_layer(1, markers, global_labels)
+cell.add_to_layer(2, marker_overlay)
+
+iop.EXECUTOR.shutdown()
+iop.EXECUTOR = None
+# ^ back to running everything in the calling thread
+
+cell.show()
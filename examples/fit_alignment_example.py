@@ -0,0 +1,30 @@
+import numpy as np
+import iopgdstoolkit as iop
+from gdshelpers.parts.port import Port
+
+# example 1
+# place markers around a device, pretend 1000 dies were printed with small random rotations and shifts, then fit a
+# transform per die from the measured marker positions and find where the device's key position ended up on each die.
+
+shape, shape_port = iop.port_shape_polar(100, port=Port((0, 0), 0, 1))
+markers, marker_list, marker_overlay = iop.layout_marker(shape)
+key_position = shape_port.origin
+
+number_of_dies = 1000
+rotation = np.random.normal(0, 0.002, number_of_dies)
+shift = np.random.normal(0, 2, (number_of_dies, 2))
+measured_list = np.stack((
+    np.cos(rotation)[:, None] * marker_list[:, 0] - np.sin(rotation)[:, None] * marker_list[:, 1],
+    np.sin(rotation)[:, None] * marker_list[:, 0] + np.cos(rotation)[:, None] * marker_list[:, 1],
+), axis=2) + shift[:, None, :]
+measured_list += np.random.normal(0, 0.05, measured_list.shape)
+# ^ stack of measured marker positions, shape (dies, markers, 2)
+
+transforms, residuals = iop.fit_alignment(measured_list, marker_list, transform='rigid')
+printed_key_positions = iop.apply_alignment(transforms, [key_position])
+
+print(
+    "Example 1:"
+    + "\nworst marker residual = " + str(np.max(np.linalg.norm(residuals, axis=2)))
+    + "\nkey position on the first die = " + str(printed_key_positions[0, 0])
+)
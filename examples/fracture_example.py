@@ -0,0 +1,34 @@
+import iopgdstoolkit as iop
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# fracture markers and overlays into rectangles and trapezoids for an e-beam writer and compare the shot count with
+# a plain scanline fracture.
+
+markers, marker_list, marker_overlay = iop.layout_marker((0, 0, 200, 200))
+markers_mitre, marker_list_mitre, marker_overlay_mitre = iop.layout_marker((400, 0, 600, 200), join_style='mitre')
+# ^ mitre corners keep the overlay rectilinear, which fractures into far fewer shots than rounded corners
+
+cell = Cell('fracture_example')
+cell.add_to_layer(1, markers, markers_mitre)
+cell.add_to_layer(2, marker_overlay)
+cell.add_to_layer(3, marker_overlay_mitre)
+
+report = iop.fracture_cell(cell)
+# ^ post-pass over the cell, each polygon is replaced by its trapezoids
+
+print(
+    "Example 1:"
+    + "\nplain scanline fracture = " + str(report['scanline_shots']) + " shots, merged = " + str(report['shots'])
+    + " shots"
+    + "\nshots per layer (scanline, merged) = " + str(report['layers'])
+)
+
+# example 2
+# fracture a single shape as it is generated
+
+hexagon, hexagon_port = iop.port_shape_polar(20, offset=(800, 0), sides=6)
+trapezoids, scanline_shots, shots = iop.fracture_geometry(hexagon)
+cell.add_to_layer(4, *trapezoids)
+
+cell.show()
@@ -0,0 +1,28 @@
+import iopgdstoolkit as iop
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# build a flat parameter sweep with many identical pads and rings, then let iop.instance_duplicates turn the
+# repeated shapes into referenced sub-cells and print the savings in terminal
+
+cell = Cell('instance_duplicates_example')
+
+for num in range(0, 20):
+    pad, pad_port = iop.port_shape_polar(10, offset=(num * 50, 0))
+    ring, ring_location = iop.port_ring(10, 5, offset=(num * 50, 100))
+    label = iop.port_shape_polar(10 + num, offset=(num * 50, 200))[0]
+    # ^ every label shape is a different size, so these stay flat in the cell
+    cell.add_to_layer(1, pad, ring)
+    cell.add_to_layer(2, label)
+
+report = iop.instance_duplicates(cell)
+
+print(
+    "Example 1:"
+    + "\nshapes: " + str(report['shapes_before']) + " -> " + str(report['shapes_after'])
+    + " using " + str(report['references']) + " references to " + str(report['instance_cells']) + " sub-cells"
+    + "\nvertices: " + str(report['vertices_before']) + " -> " + str(report['vertices_after'])
+    + "\nestimated file size (bytes): " + str(report['file_size_before']) + " -> " + str(report['file_size_after'])
+)
+
+cell.show()
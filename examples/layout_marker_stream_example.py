@@ -0,0 +1,26 @@
+import iopgdstoolkit as iop
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# surround a whole row of shapes with grid markers, consuming markers one shape at a time rather than building a
+# list of every shape first. marker positions are written to a position table as they are produced.
+
+
+def generate_shapes(number_of_shapes):
+    for num in range(0, number_of_shapes):
+        shape, shape_port = iop.port_shape_polar(100, offset=(num * 800, 0))
+        yield shape
+
+
+cell = Cell('layout_marker_stream_example')
+
+marker_stream = iop.layout_marker_stream(generate_shapes(5))
+marker_stream = iop.record_marker_positions(marker_stream, 'layout_marker_stream_positions.csv')
+# ^ positions are written as item, corner, x, y while the markers pass through to the cell below.
+# running again appends to the table, item numbers carry on from the last item already in it.
+
+for marker, marker_list, marker_overlay in marker_stream:
+    cell.add_to_layer(2, marker)
+    cell.add_to_layer(3, marker_overlay)
+
+cell.show()
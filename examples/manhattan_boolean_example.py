@@ -0,0 +1,32 @@
+import iopgdstoolkit as iop
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# combine axis aligned (Manhattan) shapes with the rectilinear engine, the results are exact on the database grid.
+# this is for exactness rather than speed, shapely's own union and buffer are quicker.
+# iop.alignment_overlay uses it for join_style='mitre' when its shapes are Manhattan.
+
+square1, square1_port = iop.port_shape_polar(20)
+square2, square2_port = iop.port_shape_polar(20, offset=(30, 10))
+grid, grid_location = iop.grid_marker(100, offset=(150, 0))
+
+print(
+    "Example 1:"
+    + "\nsquare is Manhattan: " + str(iop.is_manhattan(square1))
+    + "\nhexagon is Manhattan: " + str(iop.is_manhattan(iop.port_shape_polar(20, sides=6)[0]))
+)
+
+union = iop.manhattan_union([square1, square2])
+# ^ union of the two squares
+
+frame = iop.manhattan_difference(iop.port_shape_polar(60, offset=(150, 0))[0], grid)
+# ^ square with the grid marker cut out of it, like iop.alignment_overlay
+
+grown = iop.manhattan_buffer(union, 5)
+shrunk = iop.manhattan_buffer(frame, -1)
+# ^ grow and shrink with square corners, the same as a shapely buffer with join_style=2
+
+cell = Cell('manhattan_boolean_example')
+cell.add_to_layer(1, union, grid)  # red shapes
+cell.add_to_layer(2, grown, shrunk)  # green shapes
+cell.show()
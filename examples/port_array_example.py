@@ -0,0 +1,35 @@
+import numpy as np
+import iopgdstoolkit as iop
+from gdshelpers.parts.port import Port
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# place pads, rings and grid markers on a whole array of ports in one call each using iop.PortArray
+
+origins = [(x, y) for x in range(0, 1000, 200) for y in range(0, 600, 200)]
+ports = iop.PortArray(origins, angles=0, widths=1)
+# ^ a PortArray can also be made from a list of gdshelpers ports with iop.PortArray.from_ports
+
+pads, pad_ports = iop.port_shape_polar(20, port=ports, sides=6)
+# ^ one hexagon per port and a PortArray of their positions
+
+rings, ring_locations = iop.port_ring(40, 30, port=ports)
+grids, grid_offset = iop.grid_marker(50, port=ports, offset=(0, 80))
+overlays = iop.alignment_overlay(grids, port=ports, offset=(0, 80), radii=30)
+# ^ one overlay per grid marker, each grid marker is subtracted from the overlay at the same port
+
+distances = iop.distance_from_port([(0, 0), (500, 500)], port=ports)
+# ^ distances of two points from every port, shape (ports, points, 2)
+
+print(
+    "Example 1:"
+    + "\nnumber of ports = " + str(len(ports))
+    + "\nfirst port = " + str(ports[0].origin) + ", distances from it = " + str(distances[0].tolist())
+)
+
+cell = Cell('port_array_example')
+cell.add_to_layer(1, *pads)  # red shapes
+cell.add_to_layer(2, *rings)  # green shapes
+cell.add_to_layer(3, *grids, *overlays)  # blue shapes
+
+cell.show()
@@ -0,0 +1,28 @@
+import iopgdstoolkit as iop
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# lay out a 10 x 10 array of devices surrounded by labelled markers, then preview it as a PNG instead of cell.show()
+# which can take minutes for layouts of this size. no display is needed, so this also works on a remote machine.
+
+cell = Cell('raster_preview_example')
+
+for ii in range(0, 10):
+    for jj in range(0, 10):
+        shape, shape_port = iop.port_shape_polar(100, offset=(ii * 1000, jj * 1000))
+        markers, marker_list, marker_overlay = iop.layout_marker(shape)
+        cell.add_to_layer(1, shape)
+        cell.add_to_layer(2, markers, iop.label_global_positions(marker_list))
+        cell.add_to_layer(3, marker_overlay)
+
+image = iop.raster_preview(cell, resolution=5, file_name='raster_preview_example.png')
+# ^ 5 microns per pixel, labels smaller than a pixel are drawn as points
+
+tile_names = iop.raster_preview(cell, resolution=1, file_name='raster_preview_example_tiles.png', tile_size=2048)
+# ^ full resolution preview, written as a grid of 2048 x 2048 pixel tiles, only one tile is held in memory at a time
+
+print(
+    "Example 1:"
+    + "\npreview image size = " + str(image.shape)
+    + "\nnumber of tiles written = " + str(len(tile_names))
+)
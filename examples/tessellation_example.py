@@ -0,0 +1,31 @@
+import iopgdstoolkit as iop
+from gdshelpers.geometry.chip import Cell
+
+# example 1
+# the number of segments used for a circle grows with its radius so the chord error stays below iop.MAX_CHORD_ERROR
+
+for radius in [1, 10, 100, 1000]:
+    print("radius = " + str(radius) + ", segments = " + str(iop.segments_for_radius(radius)))
+
+# example 2
+# circles and rings made with the adaptive tessellation, small ones stay light, large ones stay accurate
+
+cell = Cell('tessellation_example')
+small_circle, small_port = iop.port_shape_polar(2, sides=None)
+large_circle, large_port = iop.port_shape_polar(200, offset=(500, 0), sides=None)
+ring, ring_port = iop.port_ring(100, 90, offset=(1000, 0))
+cell.add_to_layer(1, small_circle, large_circle, ring)
+
+# example 3
+# a coarser tolerance for a quick draft, set once for the whole module
+
+iop.MAX_CHORD_ERROR = 0.1
+draft_ring, draft_port = iop.port_ring(100, 90, offset=(1300, 0))
+cell.add_to_layer(2, draft_ring)
+print(
+    "Example 3:"
+    + "\nvertices at 10 nm = " + str(len(ring.exterior.coords) + len(ring.interiors[0].coords))
+    + ", vertices at 100 nm = " + str(len(draft_ring.exterior.coords) + len(draft_ring.interiors[0].coords))
+)
+
+cell.show()
@@ -1,12 +1,25 @@
+import os
+import types
+import warnings
+from functools import lru_cache
 from math import pi
 import numpy as np
 # ======================================================================
-from shapely.geometry import Polygon
+from shapely.geometry import Polygon, MultiPolygon
 from gdshelpers.parts.waveguide import Waveguide
 from gdshelpers.parts.port import Port
 from gdshelpers.parts.text import Text
 from gdshelpers.geometry.chip import Cell
+from gdshelpers.geometry.shapely_adapter import bounds_union, transform_bounds
 from shapely.geometry import Point
+from shapely.ops import unary_union
+from shapely.affinity import translate
+
+DATABASE_UNIT = 0.001  # grid all geometry is snapped to when exactness matters, 1 nm for designs in microns
+MAX_CHORD_ERROR = 0.01  # largest gap allowed between a curved shape and its segments, used by segments_for_radius
+EXECUTOR = None  # e.g. concurrent.futures.ThreadPoolExecutor(), runs independent pieces of a single call in parallel
+LAYER_COLOURS = [(214, 39, 40), (44, 160, 44), (31, 119, 180), (23, 190, 207), (255, 127, 14), (148, 103, 189),
+                 (140, 86, 75), (227, 119, 194), (127, 127, 127), (188, 189, 34)]  # RGB, picked by layer number
 
 
 def cart2pol(x, y):
@@ -36,6 +49,72 @@ def pol2cart(rho, phi):
     return x, y
 
 
+def _map(function, *iterables):
+    """
+    map over independent pieces of work, on iop.EXECUTOR when one is set and in this thread otherwise. results are
+    returned as a list in the order of the inputs, so merging them afterwards gives the same result either way.
+    """
+    if EXECUTOR is None:
+        return list(map(function, *iterables))
+    return list(EXECUTOR.map(function, *iterables))
+
+
+def segments_for_radius(radius, max_error=None, database_unit=DATABASE_UNIT):
+    """
+    tessellation policy for curved shapes, picks the number of straight segments used for a full circle so that the
+    chord error (the largest gap between a segment and the true circle) stays below max_error. small circles get few
+    segments and large circles get as many as they need. asking for less error than the database unit is pointless,
+    as every vertex is snapped to that grid anyway, so the error is never taken as less than database_unit.
+
+    :param radius: radius of the circle
+    :param max_error: largest allowed chord error, defaults to iop.MAX_CHORD_ERROR
+    :param database_unit: grid the geometry ends up on
+    :return: number of segments, a multiple of 4 (so circles stay symmetric) and at least 8
+    """
+    max_error = max(MAX_CHORD_ERROR if max_error is None else max_error, database_unit)
+    if radius <= max_error:
+        return 8
+    segments = int(np.ceil(pi / np.arccos(1 - max_error / radius)))
+    return max(8, 4 * int(np.ceil(segments / 4)))
+
+
+@lru_cache(maxsize=None)
+def _unit_polygon(sides):
+    """
+    read-only table of the corners of a regular polygon with a corner to centre distance of 1, the first corner at an
+    angle of pi/sides, as used by iop.port_shape_polar. tables are kept between calls.
+    """
+    theta = pi / sides + np.arange(sides) * 2 * pi / sides
+    corners = np.column_stack(pol2cart(1, theta))
+    corners.flags.writeable = False
+    return corners
+
+
+@lru_cache(maxsize=None)
+def _unit_circle(segments):
+    """
+    read-only table of the points of a circle of radius 1 made of the given number of segments, the first point at
+    an angle of 0, the same points shapely uses for Point.buffer. tables are kept between calls.
+    """
+    theta = np.arange(segments) * 2 * pi / segments
+    points = np.column_stack(pol2cart(1, theta))
+    points.flags.writeable = False
+    return points
+
+
+def _circle_ring(centre, outer_radius, inner_radius=0):
+    """
+    ring (or disk for inner_radius <= 0) around centre, the segments of each circle set by iop.segments_for_radius.
+    """
+    if inner_radius >= outer_radius:
+        return Polygon()
+    shell = _unit_circle(segments_for_radius(outer_radius)) * outer_radius + centre
+    if inner_radius <= 0:
+        return Polygon(shell)
+    core = _unit_circle(segments_for_radius(inner_radius)) * inner_radius + centre
+    return Polygon(shell, [core])
+
+
 def fill_list(number_of_items, current_list, sorting='cyclic'):
     """
     Utility function, takes an existing 1 dimensional list and repeats it to fit length determined by number_of_items.
@@ -81,6 +160,90 @@ def fill_list(number_of_items, current_list, sorting='cyclic'):
     return new_list
 
 
+class PortArray:
+    """
+    immutable, hashable struct-of-arrays alternative to a list of gdshelpers ports, holding the origins, angles and
+    widths of many ports as contiguous read-only NumPy arrays. every toolkit function that takes a port also takes a
+    PortArray, placing one shape per port in a single call and returning the batched results.
+
+    intended use is:
+
+    ports = iop.PortArray(origins=[(0, 0), (100, 0), (200, 0)], angles=0, widths=1)
+    pads, pad_ports = iop.port_shape_polar(10, port=ports)
+    """
+
+    def __init__(self, origins, angles=0, widths=1):
+        """
+        :param origins: nx2 list of port origins
+        :param angles: single angle or list of n angles, in radians
+        :param widths: single width or list of n widths
+        """
+        origins = np.array(np.reshape(origins, (-1, 2)), dtype=float)
+        angles = np.array(np.broadcast_to(angles, len(origins)), dtype=float)
+        widths = np.array(np.broadcast_to(widths, len(origins)), dtype=float)
+        origins, angles, widths = origins + 0.0, angles + 0.0, widths + 0.0  # -0.0 to 0.0, so equal arrays hash equal
+        for array in (origins, angles, widths):
+            array.flags.writeable = False
+        object.__setattr__(self, 'origins', origins)
+        object.__setattr__(self, 'angles', angles)
+        object.__setattr__(self, 'widths', widths)
+
+    @classmethod
+    def from_ports(cls, ports):
+        """
+        :param ports: list of gdshelpers ports
+        :return: PortArray holding the same origins, angles and widths
+        """
+        return cls([port.origin for port in ports], [port.angle for port in ports], [port.width for port in ports])
+
+    def to_ports(self):
+        """
+        :return: list of gdshelpers ports, one per entry
+        """
+        return [Port(origin, angle, width) for origin, angle, width in zip(self.origins, self.angles, self.widths)]
+
+    def __setattr__(self, key, value):
+        raise AttributeError('PortArray is immutable, create a new one instead')
+
+    def __len__(self):
+        return len(self.origins)
+
+    def __iter__(self):
+        return iter(self.to_ports())
+
+    def __getitem__(self, item):
+        if np.ndim(item) == 0 and not isinstance(item, slice):
+            return Port(self.origins[item], self.angles[item], self.widths[item])
+        return PortArray(self.origins[item], self.angles[item], self.widths[item])
+
+    def __eq__(self, other):
+        return isinstance(other, PortArray) and np.array_equal(self.origins, other.origins) and \
+            np.array_equal(self.angles, other.angles) and np.array_equal(self.widths, other.widths)
+
+    def __hash__(self):
+        return hash((self.origins.tobytes(), self.angles.tobytes(), self.widths.tobytes()))
+
+    def __repr__(self):
+        return 'PortArray({} ports)'.format(len(self))
+
+
+def _place_at_ports(shape, ports, offset):
+    """
+    copies a shape made at the origin to every port of a PortArray, without building it again for each port.
+    returns a list of the moved shapes and a PortArray of the ports moved by offset, like the ports of a shape.
+    """
+    if shape.geom_type in ('Polygon', 'MultiPolygon'):
+        # the coordinates are read out of shapely once and the copies are built straight from arrays
+        parts = [(np.asarray(polygon.exterior.coords), [np.asarray(interior.coords) for interior in polygon.interiors])
+                 for polygon in getattr(shape, 'geoms', [shape])]
+        shapes = [[Polygon(exterior + origin, [interior + origin for interior in interiors])
+                   for exterior, interiors in parts] for origin in ports.origins]
+        shapes = [polygons[0] if shape.geom_type == 'Polygon' else MultiPolygon(polygons) for polygons in shapes]
+    else:
+        shapes = [translate(shape, x, y) for x, y in ports.origins]
+    return shapes, PortArray(ports.origins + offset, ports.angles, ports.widths)
+
+
 def port_shape_polar(radii, port=Port((0, 0), 0, 1), offset=(0, 0), sides=4, radial_type='to_edge', rotate=0 * pi):
     """
     creates a shape defined in polar coordinates around a port location, ideal for creating shapes like hexagons
@@ -93,19 +256,25 @@ def port_shape_polar(radii, port=Port((0, 0), 0, 1), offset=(0, 0), sides=4, rad
     :param port: the imPORTant port, which you want the shapes centre to be in relation to.
     :param offset: the cartesian distance away from the port origin that you wan the shapes centre to be at.
     :param sides: number of sides the shape has e.g. 6 = hexagon. sides separated by angle = 2*pi/sides
+    set to None for a circle, the number of sides is then chosen by iop.segments_for_radius for the largest radius.
     :param radial_type: choose 'to_corner' or 'to_edge' defines whether the radius is the distance to the corners
     or the middle of the sides
     :param rotate: in radians, overal rotation of the whole shape.
     :return: list containing the shapely geometry and the port associated with it as [shape, shape_port]
+    for a PortArray, a list of shapes (one per port) and a PortArray of the shape ports.
     """
 
+    if isinstance(port, PortArray):
+        shape, _ = port_shape_polar(radii, offset=offset, sides=sides, radial_type=radial_type, rotate=rotate)
+        return _place_at_ports(shape, port, offset)
+
     origin = port.origin
-    angle = 2*pi/sides
-    theta = pi/sides + rotate
     rho = []
 
     if np.size(radii) == 1:
         radii = [radii]
+    if sides is None:
+        sides = segments_for_radius(np.max(radii))
 
     q, r = divmod(sides, np.size(radii))
     radii = q * radii + radii[:r]
@@ -115,14 +284,10 @@ def port_shape_polar(radii, port=Port((0, 0), 0, 1), offset=(0, 0), sides=4, rad
     elif radial_type == 'to_edge':
         # rho = np.sqrt(np.multiply(np.square(radii), 2))
         rho = np.divide(radii, np.cos(pi/sides))
-    points = np.add(pol2cart(rho[0], theta), offset+origin)
-
-    for num in range(1, sides):
-        theta += angle
-        temp = np.add(pol2cart(rho[num], theta), offset+origin)
-        points = np.append(points, temp)
 
-    points = np.reshape(points, (-1, 2))
+    corners = _unit_polygon(sides)  # corners at pi/sides + num*2*pi/sides
+    rotation = np.array([[np.cos(rotate), np.sin(rotate)], [-np.sin(rotate), np.cos(rotate)]])
+    points = np.reshape(rho, (-1, 1)) * np.dot(corners, rotation) + offset + origin
     shape = Polygon(points)
     shape_port = Port((offset+origin), port.angle, port.width)
 
@@ -141,8 +306,13 @@ def port_shape_cartesian(coordinate_list, port=Port((0, 0), 0, 1), offset=(0, 0)
     :param offset: the fixed distance away from the port added to each value in coordinate_list
     :param rotate: in radians, the angle the shape is rotated, centre of rotation is at port.origin + offset
     :return: list containing the shapely geometry and the port associated with it as [shape, shape_port]
+    for a PortArray, a list of shapes (one per port) and a PortArray of the shape ports.
     """
 
+    if isinstance(port, PortArray):
+        shape, _ = port_shape_cartesian(coordinate_list, offset=offset, rotate=rotate)
+        return _place_at_ports(shape, port, offset)
+
     points = np.reshape(coordinate_list, (-1, 2))
     origin = port.origin
 
@@ -176,24 +346,25 @@ def port_ring(outer_radius, inner_radius, port=Port((0, 0), 0, 1), offset=(0, 0)
     :param port: the imPORTant port in which the shape coordinates are based off.
     :param offset: the fixed distance away from the port that the ring is centred around.
     :param radial_type: either 'outer_inner' or 'centre-span', however centre-span is yet to be implemented.
+    the number of segments of each circle is chosen by iop.segments_for_radius.
     :return: list including the shapely ring object and a cartesian coordinate list of the ring's centre in
     the form [ring, [x, y]]. future update should change second entry to a port object
+    for a PortArray, a list of rings (one per port) and an nx2 array of the ring centres.
     """
 
+    if isinstance(port, PortArray):
+        ring, _ = port_ring(outer_radius, inner_radius, offset=offset, radial_type=radial_type)
+        rings, ring_ports = _place_at_ports(ring, port, offset)
+        return rings, np.array(ring_ports.origins)
+
     origin = port.origin
     if radial_type == 'outer_inner':
         ring_location = np.add(origin, offset)
-        temp = Point(ring_location)
-        shell = temp.buffer(outer_radius)
-        core = temp.buffer(inner_radius)
-        ring = shell.difference(core)
+        ring = _circle_ring(ring_location, outer_radius, inner_radius)
     elif radial_type == 'center-span' or radial_type == 'centre-span':
         print('center-span not yet implemented! defaulted to outer-inner')
         ring_location = np.add(origin, offset)
-        temp = Point(ring_location)
-        shell = temp.buffer(outer_radius)
-        core = temp.buffer(inner_radius)
-        ring = shell.difference(core)
+        ring = _circle_ring(ring_location, outer_radius, inner_radius)
 
     return ring, ring_location
 
@@ -213,8 +384,15 @@ def grid_marker(size, port=Port((0, 0), 0, 1), offset=(0, 0), num_grid=10, space
     :param theta: leave as default, legacy feature that changes the angle of the grid lines, set as perpendicular.
     :return: returns a list containing the gridmarker shapely object and cartesian offset from the port it is based off
     Note: this behaviour is different from other functions in that is gives a local position rather than a global.
+    for a PortArray, a list of grid markers (one per port) and the offset.
     """
 
+    if isinstance(port, PortArray):
+        grid, _ = grid_marker(size, offset=offset, num_grid=num_grid, space_grad=space_grad, line_width=line_width,
+                              theta=theta)
+        grids, _ = _place_at_ports(grid, port, (0, 0))
+        return grids, offset
+
     origin = port.origin
     spacing = np.linspace(0, size, num_grid)
 
@@ -231,23 +409,20 @@ def grid_marker(size, port=Port((0, 0), 0, 1), offset=(0, 0), num_grid=10, space
         temp_port = Port((offset[0] + origin[0] - (size / 2), spacing1[num]), angle=theta[0], width=line_width)
         wg_1 = Waveguide.make_at_port(temp_port)
         wg_1.add_straight_segment(size)
-        wg_1 = wg_1.get_shapely_object()
-        if num == 0:
-            grid = wg_1
-        else:
-            grid = grid.union(wg_1)
+        grid.append(wg_1.get_shapely_object())
 
     for num in range(0, np.size(spacing2)):
         temp_port = Port((spacing2[num], offset[1] + origin[1] - (size / 2)), angle=theta[1], width=line_width)
         wg_1 = Waveguide.make_at_port(temp_port)
         wg_1.add_straight_segment(size)
-        wg_1 = wg_1.get_shapely_object()
-        grid = grid.union(wg_1)
+        grid.append(wg_1.get_shapely_object())
 
+    grid = unary_union(grid)
     return grid, offset
 
 
-def alignment_overlay(shape, radii=60, sides=4, port=Port((0, 0), 0, 1), offset=(0, 0), buffer=-1, rotate=0):
+def alignment_overlay(shape, radii=60, sides=4, port=Port((0, 0), 0, 1), offset=(0, 0), buffer=-1, rotate=0,
+                      join_style='round'):
     """
     takes a shape and subtracts it from an iop.port_shape_polar object to create an inverse of the image with a buffer.
     this could be useful for coarse alignment during transfer printing or exposure. Such as defining a location for a
@@ -260,34 +435,117 @@ def alignment_overlay(shape, radii=60, sides=4, port=Port((0, 0), 0, 1), offset=
     :param offset: the fixed distance away from the port that the overlay is centred around.
     :param buffer: the spacing between the shape and overlay sides
     :param rotate: the rotation of the iop.port_shape_polar
+    :param join_style: 'round' or 'mitre', corners of the buffer. 'mitre' keeps a rectilinear overlay rectilinear,
+    and when the shape and overlay are both Manhattan (iop.is_manhattan) the overlay is then exact on the database grid.
     :return: shapely object, which is a negative of the input shape.
+    for a PortArray, shape can be a list of shapes (one per port) and a list of overlays is returned.
     """
+    if isinstance(port, PortArray):
+        overlays, _ = port_shape_polar(radii=radii, radial_type='to_edge', offset=offset, port=port, sides=sides,
+                                       rotate=rotate)
+        shapes = shape if type(shape) in [list, tuple] else [shape] * len(port)
+        return [_buffered_difference(overlay, port_shape, buffer, join_style)
+                for overlay, port_shape in zip(overlays, shapes)]
+
     # print('radii = ', radii)
     al_overlay, al_overlay_port = port_shape_polar(radii=radii, radial_type='to_edge', offset=offset,
                                                    port=port, sides=sides, rotate=rotate)
-    al_overlay = al_overlay.difference(shape)
-    al_overlay = al_overlay.buffer(buffer)
+    al_overlay = _buffered_difference(al_overlay, shape, buffer, join_style)
     return al_overlay
 
 
-def layout_marker(shape_cell_port_or_bounds, offset=(120, 120), size=100, radii=None, sides=4):
+def _buffered_difference(al_overlay, shape, buffer, join_style='round'):
     """
-    places alignment markers a fixed distance away from the corners of a shape, cell, port or bounds,
-    this is a quick way to get 4 markers around an object that is of interest and are related to each other in
-    separation. default behaviour is to produce iop.grid_markers but iop.port_shape_polar can substituted by specifying
-    values for radii.
+    the difference and buffer of iop.alignment_overlay. square corners ('mitre') of Manhattan geometry are made
+    exactly on the database grid with iop.manhattan_difference and iop.manhattan_buffer, other square corners with
+    shapely, and round corners with shapely using the number of segments set by iop.segments_for_radius.
+    """
+    if join_style == 'mitre':
+        if is_manhattan(al_overlay) and is_manhattan(shape):
+            return manhattan_buffer(manhattan_difference(al_overlay, shape), buffer)
+        return al_overlay.difference(shape).buffer(buffer, join_style=2)
+    return al_overlay.difference(shape).buffer(buffer, resolution=segments_for_radius(abs(buffer)) // 4)
 
-    :param shape_cell_port_or_bounds: can be a shapely object, a device cell, a port or just cartesian bounds
-    :param offset: a tuple in form (a, b) that represents the magnitude of the distance away from the corners of the
-    target area. The sign of the values are modified appropriately depending on which corner of four they represent.
-    :param size: the length of iop.grid_marker's sides, ignored if radii specified
-    :param radii: radius of iop.port_shape_polar from centre to middle of side, specifying causes size to be ignored.
-    :param sides: integer number of sides the iop.port_shape_polar has, default of 4
-    :return: a list containing the 4 shapely markers after geometric union, their local position in respect to their
-    respective corner and an iop.alignment_overlay of the markers.
-    In the form of [marker, marker_local_position, marker_overlay]
+
+def _geometry_bounds(geometries):
+    """
+    bounds (min_x, min_y, max_x, max_y) of a list of shapely objects or gdshelpers parts, None if there are none.
     """
+    bounds = []
+    for geometry in geometries:
+        geometry_bounds = geometry.get_shapely_object().bounds if hasattr(geometry, 'get_shapely_object') \
+            else geometry.bounds
+        if len(geometry_bounds) != 0 and not np.isnan(geometry_bounds[0]):  # empty geometry has no bounds
+            bounds.append(geometry_bounds)
+    return bounds_union(bounds) if len(bounds) > 0 else None
 
+
+def _tracked_add_to_layer(cell, layer, *geometry):
+    """
+    replacement for Cell.add_to_layer installed by iop.track_bounds, only the bounds of the new geometry are computed.
+    """
+    type(cell).add_to_layer(cell, layer, *geometry)
+    layer_bounds = [bounds for bounds in (cell.layer_bounds.get(layer), _geometry_bounds(geometry)) if bounds]
+    cell.layer_bounds[layer] = bounds_union(layer_bounds) if layer_bounds else None
+    _refresh_cell_bounds(cell)
+
+
+def _refresh_cell_bounds(cell):
+    """
+    hands the union of the cached layer bounds to the cell's own gdshelpers bounds cache, so cell.bounds is cheap too.
+    """
+    bounds = [bounds for bounds in cell.layer_bounds.values() if bounds]
+    cell._bounds = bounds_union(bounds) if bounds else None
+
+
+def track_bounds(cell, rescan=False):
+    """
+    attaches a per layer bounds cache to a gdshelpers cell as cell.layer_bounds. gdshelpers throws its cached bounds
+    away on every add_to_layer and walks every shape in the cell again the next time the bounds are asked for.
+    once tracked, the cell's add_to_layer only looks at the new shapes and keeps both the per layer bounds and the
+    gdshelpers bounds up to date. shapes put straight into cell.layer_dict are not seen, call track_bounds(cell,
+    rescan=True) afterwards. calling it again on a tracked cell does nothing, so it is safe to call every time.
+
+    :param cell: the gdshelpers cell to track
+    :param rescan: rebuild the cache from every shape in the cell, even if the cell is already tracked
+    :return: the dictionary of layer: (min_x, min_y, max_x, max_y) bounds, None for empty layers
+    """
+    if not hasattr(cell, 'layer_bounds') or rescan:
+        cell.layer_bounds = {layer: _geometry_bounds(geometries) for layer, geometries in cell.layer_dict.items()}
+        cell.add_to_layer = types.MethodType(_tracked_add_to_layer, cell)
+        _refresh_cell_bounds(cell)
+    return cell.layer_bounds
+
+
+def cell_bounds(cell, layers=None):
+    """
+    cheap replacement for cell.bounds and cell.get_bounds(layers), reading the cache kept by iop.track_bounds.
+    the cell is tracked first if it isn't already, children cells are tracked as they are reached.
+
+    :param cell: the gdshelpers cell
+    :param layers: optional list of layers to get the bounds of, all layers if None
+    :return: bounds in the form (min_x, min_y, max_x, max_y), or None if there is nothing on the layers
+    """
+    layer_bounds = track_bounds(cell)
+    bounds = [layer_bounds.get(layer) for layer in (layer_bounds.keys() if layers is None else layers)]
+    bounds = [entry for entry in bounds if entry]
+
+    for sub_cell in cell.cells:
+        sub_cell_bounds = cell_bounds(sub_cell['cell'], layers)
+        if sub_cell_bounds is not None:
+            bounds.append(transform_bounds(sub_cell_bounds, sub_cell['origin'], rotation=sub_cell['angle'] or 0))
+
+    return bounds_union(bounds) if len(bounds) > 0 else None
+
+
+def _marker_corners(shape_cell_port_or_bounds, offset):
+    """
+    finds the 4 corner positions used by iop.layout_marker, ordered bottom left, top left, top right, bottom right.
+
+    :param shape_cell_port_or_bounds: can be a shapely object, a device cell, a port or just cartesian bounds
+    :param offset: a tuple in form (a, b), the magnitude of the distance away from the corners of the target area.
+    :return: 4x2 list of corner positions
+    """
     if hasattr(shape_cell_port_or_bounds, 'origin'):
         area = shape_cell_port_or_bounds.origin
         cell_corners = [
@@ -296,6 +554,14 @@ def layout_marker(shape_cell_port_or_bounds, offset=(120, 120), size=100, radii=
             [area[0] + offset[0], area[1] + offset[1]],
             [area[0] + offset[0], area[1] - offset[1]]
         ]
+    elif hasattr(shape_cell_port_or_bounds, 'layer_dict'):
+        area = cell_bounds(shape_cell_port_or_bounds)
+        cell_corners = [
+            [area[0] - offset[0], area[1] - offset[1]],
+            [area[0] - offset[0], area[3] + offset[1]],
+            [area[2] + offset[0], area[3] + offset[1]],
+            [area[2] + offset[0], area[1] - offset[1]]
+        ]
     elif hasattr(shape_cell_port_or_bounds, 'bounds'):
         area = shape_cell_port_or_bounds.bounds
         cell_corners = [
@@ -313,38 +579,124 @@ def layout_marker(shape_cell_port_or_bounds, offset=(120, 120), size=100, radii=
             [area[2] + offset[0], area[1] - offset[1]]
         ]
 
-    if type(radii) == tuple or type(radii) == list:
-        # print(radii)
-        temp, temp_port = port_shape_polar(radii, offset=cell_corners[0], sides=sides)
-        temp_position = temp_port.origin
-        temp_overlay = alignment_overlay(temp, radii=size, sides=sides, offset=cell_corners[0])
-    else:
-        temp, temp_position = grid_marker(size, offset=cell_corners[0])
-        temp_overlay = alignment_overlay(temp, offset=cell_corners[0])
+    return cell_corners
+
+
+def layout_marker(shape_cell_port_or_bounds, offset=(120, 120), size=100, radii=None, sides=4, join_style='round'):
+    """
+    places alignment markers a fixed distance away from the corners of a shape, cell, port or bounds,
+    this is a quick way to get 4 markers around an object that is of interest and are related to each other in
+    separation. default behaviour is to produce iop.grid_markers but iop.port_shape_polar can substituted by specifying
+    values for radii.
 
+    :param shape_cell_port_or_bounds: can be a shapely object, a device cell, a port, an iop.PortArray or just
+    cartesian bounds
+    :param offset: a tuple in form (a, b) that represents the magnitude of the distance away from the corners of the
+    target area. The sign of the values are modified appropriately depending on which corner of four they represent.
+    :param size: the length of iop.grid_marker's sides, ignored if radii specified
+    :param radii: radius of iop.port_shape_polar from centre to middle of side, specifying causes size to be ignored.
+    :param sides: integer number of sides the iop.port_shape_polar has, default of 4
+    :param join_style: 'round' or 'mitre', corners of the iop.alignment_overlay buffer
+    the 4 corners are built on iop.EXECUTOR when one is set.
+    :return: a list containing the 4 shapely markers after geometric union, their local position in respect to their
+    respective corner and an iop.alignment_overlay of the markers.
+    In the form of [marker, marker_local_position, marker_overlay]
+    for a PortArray, a list with one [marker, marker_local_position, marker_overlay] per port.
+    """
 
-    marker = temp
-    marker_list = [temp_position]
-    al_overlay = temp_overlay
+    if isinstance(shape_cell_port_or_bounds, PortArray):
+        return [layout_marker(port, offset=offset, size=size, radii=radii, sides=sides, join_style=join_style)
+                for port in shape_cell_port_or_bounds]
 
-    for mm in range(1, np.size(cell_corners, 0)):
+    cell_corners = _marker_corners(shape_cell_port_or_bounds, offset)
 
+    def corner_marker(corner):
         if type(radii) == tuple or type(radii) == list:
-            temp, temp_port = port_shape_polar(radii, offset=cell_corners[mm], sides=sides)
+            temp, temp_port = port_shape_polar(radii, offset=corner, sides=sides)
             temp_position = temp_port.origin
-            temp_overlay = alignment_overlay(temp, radii=size, sides=sides, offset=cell_corners[mm])
+            temp_overlay = alignment_overlay(temp, radii=size, sides=sides, offset=corner, join_style=join_style)
+        else:
+            temp, temp_position = grid_marker(size, offset=corner)
+            temp_overlay = alignment_overlay(temp, offset=corner, join_style=join_style)
+        return temp, temp_position, temp_overlay
+
+    corners = _map(corner_marker, list(cell_corners))
+    # ^ the corners are independent, only the union below needs all of them
+    marker = [temp for temp, temp_position, temp_overlay in corners]
+    marker_list = [temp_position for temp, temp_position, temp_overlay in corners]
+    al_overlay = [temp_overlay for temp, temp_position, temp_overlay in corners]
+
+    marker = unary_union(marker)
+    al_overlay = unary_union(al_overlay)
+    marker_list = np.reshape(marker_list, (-1, 2))
+    return marker, marker_list, al_overlay
+
+
+def layout_marker_stream(shapes_cells_ports_or_bounds, offset=(120, 120), size=100, radii=None, sides=4,
+                         join_style='round'):
+    """
+    generator version of iop.layout_marker for large layouts, takes an iterable of shapes, cells, ports or bounds and
+    lazily yields the markers for one item at a time, so items can be produced and consumed as the layout is built.
+    nothing is kept between items, so memory stays flat regardless of how many items are processed.
+
+    intended use is:
+
+    for marker, marker_list, marker_overlay in iop.layout_marker_stream(device_cells):
+        cell.add_to_layer(2, marker)
+
+    :param shapes_cells_ports_or_bounds: iterable (list, generator, ...) of anything accepted by iop.layout_marker,
+    an iop.PortArray item counts as one item per port
+    :param offset: a tuple in form (a, b), passed to iop.layout_marker
+    :param size: the length of iop.grid_marker's sides, passed to iop.layout_marker
+    :param radii: radius of iop.port_shape_polar, passed to iop.layout_marker
+    :param sides: integer number of sides the iop.port_shape_polar has, passed to iop.layout_marker
+    :param join_style: 'round' or 'mitre', corners of the overlay buffer, passed to iop.layout_marker
+    :return: generator yielding [marker, marker_local_position, marker_overlay] for each item, same as iop.layout_marker
+    """
+    for item in shapes_cells_ports_or_bounds:
+        if isinstance(item, PortArray):
+            yield from layout_marker(item, offset=offset, size=size, radii=radii, sides=sides, join_style=join_style)
         else:
-            temp, temp_position = grid_marker(size, offset=cell_corners[mm])
-            temp_overlay = alignment_overlay(temp, offset=cell_corners[mm])
+            yield layout_marker(item, offset=offset, size=size, radii=radii, sides=sides, join_style=join_style)
 
 
+def _last_table_item(file_name, delimiter=','):
+    """
+    item number of the last row of a position table written by iop.record_marker_positions, None for no table.
+    only the end of the file is read, so this stays quick for large tables.
+    """
+    if not os.path.exists(file_name) or os.path.getsize(file_name) == 0:
+        return None
+    with open(file_name, 'rb') as position_table:
+        position_table.seek(max(0, os.path.getsize(file_name) - 4096))
+        last_row = position_table.read().decode().strip().splitlines()[-1]
+    return int(last_row.split(delimiter)[0])
 
-        marker = marker.union(temp)
-        marker_list.append(temp_position)
-        al_overlay = al_overlay.union(temp_overlay)
 
-    marker_list = np.reshape(marker_list, (-1, 2))
-    return marker, marker_list, al_overlay
+def record_marker_positions(marker_stream, file_name, delimiter=',', start=None):
+    """
+    passes the records of iop.layout_marker_stream straight through, writing the marker positions of every item to a
+    text position table as they go by. each row is written as item, corner, x, y and is flushed per item, so the table
+    is complete up to the last item consumed. records are yielded unchanged so geometry can still go to a cell or file.
+
+    :param marker_stream: iterable of [marker, marker_local_position, marker_overlay] e.g. iop.layout_marker_stream
+    :param file_name: path of the position table, an existing file is appended to
+    :param delimiter: column separator of the position table
+    :param start: item number of the first record. by default numbering carries on after the last item already in
+    the table, so rows appended by separate runs can still be told apart.
+    :return: generator yielding the unchanged [marker, marker_local_position, marker_overlay] records
+    """
+    if start is None:
+        last_item = _last_table_item(file_name, delimiter)
+        start = 0 if last_item is None else last_item + 1
+
+    with open(file_name, 'a') as position_table:
+        for item, record in enumerate(marker_stream, start):
+            marker_list = np.reshape(record[1], (-1, 2))
+            rows = np.column_stack((np.full(len(marker_list), item), np.arange(len(marker_list)), marker_list))
+            np.savetxt(position_table, rows, fmt=('%d', '%d', '%.6f', '%.6f'), delimiter=delimiter)
+            position_table.flush()
+            yield record
 
 
 def distance_from_port(coordinate_list, port=Port((0, 0), 0, 1), offset=(0, 0)):
@@ -361,7 +713,12 @@ def distance_from_port(coordinate_list, port=Port((0, 0), 0, 1), offset=(0, 0)):
     :param offset: adds an offset to the port location, as the key area may actually be a
     fixed distance away from the port.
     :return: a list of coordinates that represent distance of coordinate list to a particular port.
+    for a PortArray, an array of shape (ports, coordinates, 2) of the distances to every port.
     """
+    if isinstance(port, PortArray):
+        coordinate_list = np.reshape(coordinate_list, (-1, 2))
+        return coordinate_list[None, :, :] - port.origins[:, None, :] - offset
+
     origin = port.origin
     coordinate_list = np.reshape(coordinate_list, (-1, 2))
 
@@ -375,6 +732,175 @@ def distance_from_port(coordinate_list, port=Port((0, 0), 0, 1), offset=(0, 0)):
     return port_distances
 
 
+def fit_alignment(measured_positions, design_positions, transform='affine'):
+    """
+    fits a transform per die that maps design marker positions onto the marker positions measured after printing.
+    intended for the marker_list of iop.layout_marker, stacked for thousands of dies at once, all dies are solved
+    together with batched least squares rather than one at a time.
+
+    :param measured_positions: array of shape (dies, markers, 2), or (markers, 2) for a single die
+    :param design_positions: array of the same shape as measured_positions, or (markers, 2) if every die shares them
+    :param transform: choose 'rigid' (rotation + translation), 'similarity' (rigid + uniform scale) or 'affine'
+    :return: list containing the fitted transforms as an array of shape (dies, 2, 3) in the form [matrix | translation]
+    and the residuals (measured - fitted design positions) of shape (dies, markers, 2), as [transforms, residuals]
+    """
+    measured = np.asarray(measured_positions, dtype=float).reshape(-1, np.shape(measured_positions)[-2], 2)
+    design = np.broadcast_to(np.asarray(design_positions, dtype=float), measured.shape)
+    markers = measured.shape[1]
+
+    if transform == 'rigid' or transform == 'similarity':
+        if markers < 2:
+            raise ValueError(transform + ' transform needs at least 2 markers per die \n')
+        measured_centre = np.mean(measured, axis=1, keepdims=True)
+        design_centre = np.mean(design, axis=1, keepdims=True)
+        measured_local = measured - measured_centre
+        design_local = design - design_centre
+
+        covariance = np.einsum('nki,nkj->nij', measured_local, design_local) / markers
+        u, sigma, vt = np.linalg.svd(covariance)
+        reflection = np.sign(np.linalg.det(u) * np.linalg.det(vt))  # keep a proper rotation, never a mirror
+        correction = np.ones((len(measured), 2))
+        correction[:, 1] = reflection
+        matrix = np.einsum('nij,nj,njk->nik', u, correction, vt)
+
+        if transform == 'similarity':
+            variance = np.sum(design_local ** 2, axis=(1, 2)) / markers
+            matrix *= (np.sum(sigma * correction, axis=1) / variance)[:, None, None]
+
+        translation = measured_centre[:, 0] - np.einsum('nij,nj->ni', matrix, design_centre[:, 0])
+        transforms = np.concatenate((matrix, translation[:, :, None]), axis=2)
+
+    elif transform == 'affine':
+        if markers < 3:
+            raise ValueError('affine transform needs at least 3 markers per die \n')
+        design_homogeneous = np.concatenate((design, np.ones(design.shape[:2] + (1,))), axis=2)
+        transforms = np.swapaxes(np.linalg.pinv(design_homogeneous) @ measured, 1, 2)
+
+    else:
+        raise ValueError(str(transform) + ' transform is not supported, choose rigid, similarity or affine \n')
+
+    residuals = measured - apply_alignment(transforms, design)
+    return transforms, residuals
+
+
+def apply_alignment(transforms, positions):
+    """
+    maps design positions through the transforms fitted by iop.fit_alignment in one pass, such as device key positions
+    from iop.distance_from_port, giving where they actually are on each die after printing.
+
+    :param transforms: array of shape (dies, 2, 3) as returned by iop.fit_alignment, or (2, 3) for a single die
+    :param positions: array of shape (dies, points, 2), or (points, 2) to map the same positions through every die
+    :return: array of shape (dies, points, 2) of the transformed positions
+    """
+    transforms = np.reshape(transforms, (-1, 2, 3))
+    positions = np.asarray(positions, dtype=float).reshape(-1, np.shape(positions)[-2], 2)
+    return np.einsum('nij,nkj->nki', transforms[:, :, :2], positions) + transforms[:, None, :, 2]
+
+
+def _die_key(die_id):
+    """
+    text key of a die id for iop.DieCoordinateStore, the same for ids with the same values whatever their types,
+    NumPy numbers become Python numbers and lists and arrays become tuples before converting to text.
+    """
+    def plain(value):
+        if isinstance(value, (tuple, list, np.ndarray)):
+            return tuple(plain(entry) for entry in value)
+        return value.item() if isinstance(value, np.generic) else value
+    return str(plain(die_id))
+
+
+class DieCoordinateStore:
+    """
+    on-disk coordinate store for wafer level position sets, such as marker positions from iop.layout_marker_stream or
+    key positions from iop.distance_from_port and iop.apply_alignment, partitioned by die (or grid cell).
+    all positions live in one raw float64 file that is memory-mapped, and a small index maps each die id to its rows,
+    so the positions of one die are a slice of the mapped file and nothing is read until it is used.
+    new dies are appended to the end of both files, existing data is never rewritten.
+
+    intended use is:
+
+    store = iop.DieCoordinateStore('wafer_positions')
+    store.add_die((0, 1), marker_list)
+    positions = store[(0, 1)]
+    """
+
+    def __init__(self, path):
+        """
+        opens the store in directory path, creating it if it does not exist yet.
+
+        :param path: directory holding positions.f8 (x, y rows) and index.csv (start, stop, die id rows)
+        """
+        self.path = path
+        self.positions_file = os.path.join(path, 'positions.f8')
+        self.index_file = os.path.join(path, 'index.csv')
+        self.index = {}
+        self._positions = None
+
+        os.makedirs(path, exist_ok=True)
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as index:
+                for line in index:
+                    start, stop, die_id = line.rstrip('\n').split(',', 2)
+                    self.index[die_id] = (int(start), int(stop))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, die_id):
+        return _die_key(die_id) in self.index
+
+    def __getitem__(self, die_id):
+        """
+        positions of one die as a read-only nx2 view of the memory-mapped file.
+        """
+        start, stop = self.index[_die_key(die_id)]
+        if start == stop:  # a die without positions, the file may still be empty and cannot be mapped
+            positions = np.empty((0, 2), dtype=np.float64)
+            positions.flags.writeable = False
+            return positions
+        if self._positions is None:
+            self._positions = np.memmap(self.positions_file, dtype=np.float64, mode='r').reshape(-1, 2)
+        return self._positions[start:stop]
+
+    def die_ids(self):
+        """
+        :return: list of the die ids in the store, in the order they were added, as strings
+        """
+        return list(self.index.keys())
+
+    def add_die(self, die_id, positions):
+        """
+        appends the positions of one die to the store.
+
+        :param die_id: any id for the die, such as an integer or a (row, column) tuple, it is stored as text.
+        NumPy numbers are stored as the matching Python numbers and lists or arrays as tuples, so (np.int64(0), 1),
+        [0, 1] and (0, 1) are the same die
+        :param positions: coordinate list in the form (x, y, x, y) or nx2, like marker_list from iop.layout_marker
+        """
+        self.add_dies([(die_id, positions)])
+
+    def add_dies(self, die_positions):
+        """
+        appends the positions of many dies, opening the files once. takes any iterable so dies can be streamed in.
+
+        :param die_positions: iterable of (die_id, positions) pairs, see add_die
+        """
+        with open(self.positions_file, 'ab') as positions_file, open(self.index_file, 'a') as index:
+            for die_id, positions in die_positions:
+                die_id = _die_key(die_id)
+                if die_id in self.index:
+                    raise ValueError('die id "{}" already in the store \n'.format(die_id))
+                positions = np.ascontiguousarray(np.reshape(positions, (-1, 2)), dtype=np.float64)
+
+                start = positions_file.tell() // 16
+                positions_file.write(positions.tobytes())
+                positions_file.flush()
+                index.write('{},{},{}\n'.format(start, start + len(positions), die_id))
+                self.index[die_id] = (start, start + len(positions))
+
+        self._positions = None  # the mapped file has grown, map it again on the next read
+
+
 def label_local_positions(global_position, local_position, offset=(0, -70), size=10):
     """
     creates a text label under a marker that denotes the distance away from a particular port location (local position).
@@ -386,6 +912,7 @@ def label_local_positions(global_position, local_position, offset=(0, -70), size
     :param offset: the text label positions is based off the global positions, an offset can be added
     for better visual alignment
     :param size: the size of the text
+    each label is rendered on iop.EXECUTOR when one is set, the union is done in order afterwards.
     :return: shapely object that is the geometric union of all of the labels
     """
     if len(global_position) != len(local_position):
@@ -399,14 +926,12 @@ def label_local_positions(global_position, local_position, offset=(0, -70), size
             temp_label = temp_label.get_shapely_object()
             local_labels = temp_label
         else:
-            temp_label = Text((np.add(global_position[0], offset)), size, 'L ' + str(local_position[0]),
-                              alignment='center-top')
-            temp_label = temp_label.get_shapely_object()
-            local_labels = temp_label
-            for num in range(1, len(local_position)):
-                temp_label = Text((np.add(global_position[num], offset)), size, 'L ' + str(local_position[num]),
-                                  alignment='center-top')
-                temp_label = temp_label.get_shapely_object()
+            temp_labels = _map(lambda num: Text((np.add(global_position[num], offset)), size,
+                                                'L ' + str(local_position[num]),
+                                                alignment='center-top').get_shapely_object(),
+                               range(0, len(local_position)))
+            local_labels = temp_labels[0]
+            for temp_label in temp_labels[1:]:
                 local_labels = local_labels.union(temp_label)
 
     return local_labels
@@ -422,6 +947,7 @@ def label_global_positions(global_position, offset=(0, -90), size=10):
     :param offset: the text label positions is based off the global positions, an offset can be added
     for better visual alignment
     :param size: the size of the text
+    each label is rendered on iop.EXECUTOR when one is set, the union is done in order afterwards.
     :return: shapely object that is the geometric union of all of the labels
     """
     if np.size(global_position) == 2:
@@ -430,14 +956,12 @@ def label_global_positions(global_position, offset=(0, -90), size=10):
         temp_label = temp_label.get_shapely_object()
         global_labels = temp_label
     else:
-        temp_label = Text((np.add(global_position[0], offset)), size, 'G ' + str(global_position[0]),
-                          alignment='center-top')
-        temp_label = temp_label.get_shapely_object()
-        global_labels = temp_label
-        for num in range(1, len(global_position)):
-            temp_label = Text((np.add(global_position[num], offset)), size, 'G ' + str(global_position[num]),
-                              alignment='center-top')
-            temp_label = temp_label.get_shapely_object()
+        temp_labels = _map(lambda num: Text((np.add(global_position[num], offset)), size,
+                                            'G ' + str(global_position[num]),
+                                            alignment='center-top').get_shapely_object(),
+                           range(0, len(global_position)))
+        global_labels = temp_labels[0]
+        for temp_label in temp_labels[1:]:
             global_labels = global_labels.union(temp_label)
 
     return global_labels
@@ -470,6 +994,742 @@ def label_with_parameter_dictionary(dictionary, parameters_per_line=2, position=
     return cell_label
 
 
+def _gds_boundary_bytes(points):
+    """
+    estimates the size of a GDSII BOUNDARY record holding a ring of the given number of points.
+    """
+    return 24 + 8 * points
+
+
+def _gds_reference_bytes(name):
+    """
+    estimates the size of a GDSII SREF record referencing a cell of the given name.
+    """
+    return 24 + len(name) + len(name) % 2
+
+
+def _ring_arrays(geometry):
+    """
+    returns the coordinate arrays of every ring (exteriors and interiors) in a Polygon or MultiPolygon.
+    """
+    polygons = geometry.geoms if hasattr(geometry, 'geoms') else [geometry]
+    rings = []
+    for polygon in polygons:
+        rings.append(np.asarray(polygon.exterior.coords))
+        rings += [np.asarray(interior.coords) for interior in polygon.interiors]
+    return rings
+
+
+def _shape_from_rings(rings, interior_counts, database_unit=DATABASE_UNIT):
+    """
+    rebuilds a Polygon or MultiPolygon from the ring arrays given by iop._ring_arrays, scaled by database_unit.
+    interior_counts is the number of interiors of each polygon, a MultiPolygon is returned for more than one polygon.
+    """
+    polygons = []
+    ring = 0
+    for interiors in interior_counts:
+        polygons.append(Polygon(rings[ring] * database_unit,
+                                [interior * database_unit for interior in rings[ring + 1:ring + 1 + interiors]]))
+        ring += 1 + interiors
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+def instance_duplicates(cell, min_count=2, database_unit=DATABASE_UNIT):
+    """
+    geometry deduplication pass for flat, script-generated cells. parameter sweeps tend to put many copies of the same
+    shape into a cell, only differing by translation (iop.port_shape_polar pads, iop.port_ring platforms, markers).
+    every polygon in cell.layer_dict is normalised to the origin and snapped to the database unit, identical
+    geometry is found by hashing and each group is moved into one sub-cell that is referenced at every position.
+    the cell is modified in place, geometry that is not a shapely Polygon or MultiPolygon is left untouched.
+    sub-cells are named cell.name + '_instance_' + a number not yet used by any cell in the tree, so the pass can be
+    run again on the same cell after more shapes have been added.
+
+    :param cell: the gdshelpers cell to compact
+    :param min_count: minimum number of copies before a shape is turned into a sub-cell
+    :param database_unit: grid the geometry is snapped to, positions of the references are also on this grid
+    :return: dictionary reporting the savings, containing the number of shapes, references and vertices before and
+    after as well as estimates of the memory used by the coordinates and of the GDSII file size before and after.
+    """
+    used_names = set()  # every cell name in the tree, gdshelpers needs them to be unique when saving
+    cells = [cell]
+    while cells:
+        parent = cells.pop()
+        used_names.add(parent.name)
+        cells += [child['cell'] for child in parent.cells]
+    instance_number = 0
+
+    report = {
+        'shapes_before': 0, 'shapes_after': 0, 'references': 0, 'instance_cells': 0,
+        'vertices_before': 0, 'vertices_after': 0,
+        'memory_before': 0, 'memory_after': 0,
+        'file_size_before': 0, 'file_size_after': 0,
+    }
+
+    for layer in list(cell.layer_dict.keys()):
+        groups = {}
+        keys = []
+        for geometry in cell.layer_dict[layer]:
+            shape = geometry.get_shapely_object() if hasattr(geometry, 'get_shapely_object') else geometry
+            if getattr(shape, 'geom_type', None) not in ('Polygon', 'MultiPolygon') or shape.is_empty:
+                keys.append(None)
+                continue
+
+            shape = shape.normalize()
+            rings = _ring_arrays(shape)
+            origin = np.min(np.concatenate(rings), axis=0)
+            rings = [np.rint((ring - origin) / database_unit).astype(np.int64) for ring in rings]
+            position = np.rint(origin / database_unit).astype(np.int64)
+            interior_counts = tuple(len(polygon.interiors) for polygon in getattr(shape, 'geoms', [shape]))
+            key = (interior_counts,) + tuple(ring.tobytes() for ring in rings)
+
+            if key not in groups:
+                groups[key] = (rings, [])
+            groups[key][1].append(position)
+            keys.append(key)
+
+            boundary_bytes = sum(_gds_boundary_bytes(len(ring)) for ring in rings)
+            report['shapes_before'] += 1
+            report['vertices_before'] += sum(len(ring) for ring in rings)
+            report['file_size_before'] += boundary_bytes
+
+        instanced = set()
+        for key, (rings, positions) in groups.items():
+            vertices = sum(len(ring) for ring in rings)
+            boundary_bytes = sum(_gds_boundary_bytes(len(ring)) for ring in rings)
+            if len(positions) < min_count:
+                report['shapes_after'] += len(positions)
+                report['vertices_after'] += vertices * len(positions)
+                report['file_size_after'] += boundary_bytes * len(positions)
+                continue
+
+            while '{}_instance_{}'.format(cell.name, instance_number) in used_names:
+                instance_number += 1
+            instance_name = '{}_instance_{}'.format(cell.name, instance_number)
+            used_names.add(instance_name)
+            instance_number += 1
+            instance_cell = Cell(instance_name)
+            instance_cell.add_to_layer(layer, _shape_from_rings(rings, key[0], database_unit))
+            for position in positions:
+                cell.add_cell(instance_cell, origin=tuple(position * database_unit))
+            instanced.add(key)
+
+            report['instance_cells'] += 1
+            report['references'] += len(positions)
+            report['shapes_after'] += 1
+            report['vertices_after'] += vertices
+            report['file_size_after'] += boundary_bytes + 36 + len(instance_name) + len(instance_name) % 2
+            report['file_size_after'] += _gds_reference_bytes(instance_name) * len(positions)
+
+        kept = [geometry for geometry, key in zip(cell.layer_dict[layer], keys) if key not in instanced]
+        if kept:
+            cell.layer_dict[layer] = kept
+        else:
+            del cell.layer_dict[layer]
+
+    cell._bounds = None  # layer_dict was changed directly, so the cached gdshelpers bounds are no longer valid
+    if hasattr(cell, 'layer_bounds'):
+        track_bounds(cell, rescan=True)
+    report['memory_before'] = 16 * report['vertices_before']
+    report['memory_after'] = 16 * report['vertices_after'] + 16 * report['references']
+    return report
+
+
+def _cell_polygons(cell, origin=(0, 0), angle=0, min_size=0):
+    """
+    walks a cell and its children, yielding (layer, rings) for every polygon, where rings is a list of nx2 arrays of the
+    exterior and interior coordinates already moved to their position in the top cell. any geometry (including whole
+    collections) smaller than min_size in both directions is not broken down, its bounding box is yielded instead.
+    """
+    c, s = np.cos(angle), np.sin(angle)
+    rotation = np.array([[c, s], [-s, c]])
+    stack = [(layer, geometry) for layer, geometries in cell.layer_dict.items() for geometry in geometries][::-1]
+    while stack:
+        layer, geometry = stack.pop()
+        geometry = geometry.get_shapely_object() if hasattr(geometry, 'get_shapely_object') else geometry
+        if type(geometry) in [list, tuple]:
+            stack += [(layer, entry) for entry in geometry][::-1]
+            continue
+
+        bounds = geometry.bounds
+        if len(bounds) == 0 or np.isnan(bounds[0]):  # empty geometry
+            continue
+        elif max(bounds[2] - bounds[0], bounds[3] - bounds[1]) < min_size:
+            yield layer, [np.dot(np.reshape(bounds, (2, 2)), rotation) + origin]
+        elif hasattr(geometry, 'geoms'):
+            stack += [(layer, entry) for entry in geometry.geoms][::-1]
+        elif hasattr(geometry, 'exterior'):
+            yield layer, [np.dot(ring, rotation) + origin for ring in _ring_arrays(geometry)]
+
+    for sub_cell in cell.cells:
+        sub_origin = np.dot(sub_cell['origin'], rotation) + origin
+        yield from _cell_polygons(sub_cell['cell'], sub_origin, angle + (sub_cell['angle'] or 0), min_size)
+
+
+def _fill_polygon(image, rings, colour):
+    """
+    scanline fills a polygon given in pixel coordinates into image using the even-odd rule, a pixel is filled when its
+    centre is inside the polygon. polygons smaller than a pixel are drawn as a single point at their centre.
+    """
+    points = np.concatenate(rings)
+    x_min, y_min = np.min(points, axis=0)
+    x_max, y_max = np.max(points, axis=0)
+    height, width = image.shape[:2]
+
+    if x_max - x_min < 1 and y_max - y_min < 1:
+        column, row = int(np.floor((x_min + x_max) / 2)), int(np.floor((y_min + y_max) / 2))
+        if 0 <= row < height and 0 <= column < width:
+            image[row, column] = colour
+        return
+
+    rows = np.arange(max(int(np.ceil(y_min - 0.5)), 0), min(int(np.floor(y_max - 0.5)) + 1, height))
+    first, last = max(int(np.floor(x_min)), 0), min(int(np.ceil(x_max)) + 1, width)
+    if len(rows) == 0 or last <= first:  # outside of the image
+        return
+    start = np.concatenate([ring[:-1] for ring in rings])
+    end = np.concatenate([ring[1:] for ring in rings])
+    sloped = start[:, 1] != end[:, 1]
+    start, end = start[sloped], end[sloped]
+
+    centres = rows[:, None] + 0.5
+    crossing = (np.minimum(start[:, 1], end[:, 1]) <= centres) & (centres < np.maximum(start[:, 1], end[:, 1]))
+    crossings = start[:, 0] + (centres - start[:, 1]) * (end[:, 0] - start[:, 0]) / (end[:, 1] - start[:, 1])
+    crossings = np.sort(np.where(crossing, crossings, np.inf), axis=1)
+    crossings = crossings[:, :np.max(np.sum(crossing, axis=1))]
+
+    columns = np.clip(np.ceil(crossings - 0.5), first, last).astype(np.int64) - first  # unused crossings are inf
+    row_index = np.broadcast_to(np.arange(len(rows))[:, None], columns.shape)
+    steps = np.zeros((len(rows), last - first + 1), dtype=np.int64)
+    np.add.at(steps, (row_index[:, 0::2], columns[:, 0::2]), 1)
+    np.add.at(steps, (row_index[:, 1::2], columns[:, 1::2]), -1)
+    inside = np.cumsum(steps[:, :-1], axis=1) > 0
+    image[rows[0]:rows[-1] + 1, first:last][inside] = colour
+
+
+def raster_preview(cell, resolution=1.0, file_name=None, tile_size=None, colours=None, background=(255, 255, 255)):
+    """
+    headless replacement for cell.show() on large layouts. rasterises every polygon of a cell (and its children) into
+    a NumPy RGB image with one colour per layer, without going through matplotlib's drawing of each polygon.
+    shapes smaller than a pixel are drawn as a single point, so a whole wafer of markers and labels stays fast.
+    the image can be written to a PNG, or to a grid of PNG tiles, without needing a display.
+    when tiling, only one tile is held in memory at a time: the polygons are sorted into the tiles they overlap and
+    each tile is filled, clipped to its own window, written and dropped before the next, so a wafer can be previewed
+    at a resolution whose full image would not fit in memory.
+
+    :param cell: the gdshelpers cell to preview
+    :param resolution: size of one pixel in the units of the design, e.g. 1 = 1 pixel per micron
+    :param file_name: optional path of the PNG to write, tiles are named file_row_column.png
+    :param tile_size: optional integer, writes the image as square tiles of this many pixels, needs file_name
+    :param colours: optional dictionary of layer: (r, g, b), layers not in it use iop.LAYER_COLOURS
+    :param background: (r, g, b) colour of empty space
+    :return: the image as a NumPy array of shape (rows, columns, 3), row 0 is the top of the layout.
+    when tiling, the list of tile file names written instead.
+    """
+    colours = dict(colours or {})
+    bounds = cell_bounds(cell)
+    if bounds is None:
+        raise ValueError('cannot preview an empty cell \n')
+    if tile_size is not None and file_name is None:
+        raise ValueError('tile_size needs a file_name to write the tiles to \n')
+
+    width = int(np.ceil((bounds[2] - bounds[0]) / resolution)) + 1
+    height = int(np.ceil((bounds[3] - bounds[1]) / resolution)) + 1
+
+    to_pixels = np.array([1, -1]) / resolution
+    top_left = np.array([bounds[0], bounds[3]])
+    polygons = _preview_polygons(cell, resolution, colours, top_left, to_pixels)
+
+    if tile_size is None:
+        image = np.empty((height, width, 3), dtype=np.uint8)
+        image[:] = background
+        for pixel_rings, colour in polygons:
+            _fill_polygon(image, pixel_rings, colour)
+        if file_name is not None:
+            from matplotlib.image import imsave
+            imsave(file_name, image)
+        return image
+
+    from matplotlib.image import imsave
+    tiles = {}  # (tile row, tile column): polygons overlapping the tile, in drawing order
+    for pixel_rings, colour in polygons:
+        points = np.concatenate(pixel_rings)
+        (x_min, y_min), (x_max, y_max) = np.min(points, axis=0), np.max(points, axis=0)
+        for row in range(max(int(y_min) // tile_size, 0), min(int(y_max) // tile_size, (height - 1) // tile_size) + 1):
+            for column in range(max(int(x_min) // tile_size, 0),
+                                min(int(x_max) // tile_size, (width - 1) // tile_size) + 1):
+                tiles.setdefault((row, column), []).append((pixel_rings, colour))
+
+    root, extension = os.path.splitext(file_name)
+    tile_names = []
+    for row in range(0, (height - 1) // tile_size + 1):
+        for column in range(0, (width - 1) // tile_size + 1):
+            tile = np.empty((min(tile_size, height - row * tile_size), min(tile_size, width - column * tile_size), 3),
+                            dtype=np.uint8)
+            tile[:] = background
+            tile_corner = np.array([column, row]) * tile_size
+            for pixel_rings, colour in tiles.pop((row, column), []):
+                _fill_polygon(tile, [ring - tile_corner for ring in pixel_rings], colour)
+            tile_names.append('{}_{}_{}{}'.format(root, row, column, extension or '.png'))
+            imsave(tile_names[-1], tile)
+
+    return tile_names
+
+
+def _preview_polygons(cell, resolution, colours, top_left, to_pixels):
+    """
+    list of (pixel rings, colour) for every polygon of a cell in drawing order, as used by iop.raster_preview.
+    colours is filled in with iop.LAYER_COLOURS for layers that are not in it.
+    """
+    polygons = []
+    for layer, rings in _cell_polygons(cell, min_size=resolution):
+        if layer not in colours:
+            layer_number = layer[0] if type(layer) == tuple else layer
+            colours[layer] = LAYER_COLOURS[int(layer_number) % len(LAYER_COLOURS)]
+        polygons.append(([(ring - top_left) * to_pixels for ring in rings], colours[layer]))
+    return polygons
+
+
+def _manhattan_rings(geometries, database_unit=DATABASE_UNIT):
+    """
+    snaps the rings of shapely Polygons and MultiPolygons to integer multiples of database_unit and orients them so
+    exteriors run anti-clockwise and interiors clockwise. returns None if any geometry is not polygonal or any edge is
+    not horizontal or vertical on the database grid, in which case the geometry is not Manhattan.
+    """
+    rings = []
+    for geometry in geometries:
+        if getattr(geometry, 'geom_type', None) not in ('Polygon', 'MultiPolygon'):
+            return None
+        for polygon in getattr(geometry, 'geoms', [geometry]):
+            if polygon.is_empty:
+                continue
+            polygon_rings = [np.asarray(polygon.exterior.coords)] + \
+                            [np.asarray(interior.coords) for interior in polygon.interiors]
+            for number, ring in enumerate(polygon_rings):
+                ring = np.rint(ring / database_unit).astype(np.int64)
+                step = np.diff(ring, axis=0)
+                if np.any((step[:, 0] != 0) & (step[:, 1] != 0)):
+                    return None
+                area = np.sum(ring[:-1, 0] * ring[1:, 1] - ring[1:, 0] * ring[:-1, 1])
+                if (area < 0) == (number == 0):  # exterior clockwise or interior anti-clockwise
+                    ring = ring[::-1]
+                rings.append(ring)
+    return rings
+
+
+def is_manhattan(geometry, database_unit=DATABASE_UNIT):
+    """
+    checks if a shapely geometry is rectilinear (Manhattan), made of polygons whose edges are all horizontal or
+    vertical once snapped to the database grid, such as iop.grid_marker and iop.port_shape_polar with sides=4.
+
+    :param geometry: shapely object
+    :param database_unit: grid the coordinates are snapped to before checking
+    :return: True if the geometry can be handled by the iop.manhattan_* functions
+    """
+    return _manhattan_rings([geometry], database_unit) is not None
+
+
+def _manhattan_grid(rings, xs, ys):
+    """
+    rasterises oriented integer rings onto the cells between the sorted unique coordinates xs and ys. a cell is filled
+    where the winding number is above zero, which is the union of every ring given.
+    """
+    steps = np.zeros((len(ys), len(xs)), dtype=np.int64)
+    if rings:
+        start = np.concatenate([ring[:-1] for ring in rings])
+        end = np.concatenate([ring[1:] for ring in rings])
+        vertical = start[:, 1] != end[:, 1]
+        start, end = start[vertical], end[vertical]
+        column = np.searchsorted(xs, start[:, 0])
+        direction = np.where(end[:, 1] < start[:, 1], 1, -1)  # anti-clockwise exteriors run down on their left side
+        np.add.at(steps, (np.searchsorted(ys, np.minimum(start[:, 1], end[:, 1])), column), direction)
+        np.add.at(steps, (np.searchsorted(ys, np.maximum(start[:, 1], end[:, 1])), column), -direction)
+    winding = np.cumsum(np.cumsum(steps, axis=0)[:-1], axis=1)[:, :-1]
+    return winding > 0
+
+
+def _manhattan_coordinates(*ring_lists):
+    """
+    sorted unique x and y coordinates of every ring in the given lists of rings.
+    """
+    points = np.concatenate([ring for rings in ring_lists for ring in rings] or [np.zeros((0, 2), dtype=np.int64)])
+    return np.unique(points[:, 0]), np.unique(points[:, 1])
+
+
+def _manhattan_rectangles(grid, xs, ys):
+    """
+    breaks a filled grid into rectangles, one per horizontal run of filled cells in each row.
+    returns an nx4 integer array of (min_x, min_y, max_x, max_y).
+    """
+    padded = np.zeros((grid.shape[0], grid.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = grid
+    change = np.diff(padded, axis=1)
+    row, first = np.nonzero(change == 1)
+    last = np.nonzero(change == -1)[1]
+    return np.column_stack((xs[first], ys[row], xs[last], ys[row + 1]))
+
+
+def _rectangle_rings(rectangles):
+    """
+    anti-clockwise integer rings of an nx4 array of (min_x, min_y, max_x, max_y) rectangles.
+    """
+    x0, y0, x1, y1 = rectangles.T
+    return list(np.stack((np.column_stack((x0, y0)), np.column_stack((x1, y0)), np.column_stack((x1, y1)),
+                          np.column_stack((x0, y1)), np.column_stack((x0, y0))), axis=1))
+
+
+def _manhattan_trace(grid, xs, ys, database_unit=DATABASE_UNIT):
+    """
+    turns a filled grid back into a shapely Polygon or MultiPolygon by following the boundary between filled and empty
+    cells. filled cells touching only at a corner are kept in separate rings, unless they are joined elsewhere, in
+    which case the empty cells at the corner are split into separate rings instead (a hole touching its shell).
+    """
+    rows, columns = grid.shape
+    padded = np.zeros((rows + 2, columns + 2), dtype=bool)
+    padded[1:-1, 1:-1] = grid
+
+    # boundary edges as (start column, start row, end column, end row) on the coordinate lattice,
+    # with the filled side on the left
+    left, right = padded[1:-1, :-1], padded[1:-1, 1:]
+    below, above = padded[:-1, 1:-1], padded[1:, 1:-1]
+    j, i = np.nonzero(right & ~left)
+    edges = [np.column_stack((i, j + 1, i, j))]
+    j, i = np.nonzero(left & ~right)
+    edges.append(np.column_stack((i, j, i, j + 1)))
+    j, i = np.nonzero(above & ~below)
+    edges.append(np.column_stack((i, j, i + 1, j)))
+    j, i = np.nonzero(below & ~above)
+    edges.append(np.column_stack((i + 1, j, i, j)))
+    edges = np.concatenate(edges)
+    if len(edges) == 0:
+        return Polygon()
+
+    # the next edge around each ring starts where the edge ends, at a corner shared by two filled cells there are two
+    # edges to choose from and the left turn is taken, keeping the two cells (or two empty cells) in separate rings
+    width = len(xs) + 1
+    start_key = edges[:, 1] * width + edges[:, 0]
+    end_key = edges[:, 3] * width + edges[:, 2]
+    order = np.argsort(start_key, kind='stable')
+    candidate = order[np.searchsorted(start_key[order], end_key)]
+    shared = np.bincount(start_key, minlength=width * (len(ys) + 1))[end_key] > 1
+    alternative = order[np.minimum(np.searchsorted(start_key[order], end_key) + 1, len(order) - 1)]
+    direction = edges[:, 2:] - edges[:, :2]
+    turn = direction[:, 0] * direction[candidate, 1] - direction[:, 1] * direction[candidate, 0]
+    following = np.where(shared & (turn < 0), alternative, candidate)
+
+    # a ring that comes through a shared corner twice goes around two filled cells that are also joined elsewhere, so
+    # the two empty cells there belong to different regions (a hole touching the shell or another hole). the right
+    # turn is taken there instead, splitting the ring into one ring per region as a valid polygon needs
+    sequence, ring_start = _walk_rings(following.tolist())
+    ring_number = np.empty(len(edges), dtype=np.int64)
+    ring_number[sequence] = np.repeat(np.arange(len(ring_start)), np.diff(ring_start + [len(sequence)]))
+    order = np.argsort(end_key, kind='stable')
+    pair = end_key[order[:-1]] == end_key[order[1:]]
+    first, second = order[:-1][pair], order[1:][pair]
+    pinched = ring_number[first] == ring_number[second]
+    if np.any(pinched):
+        first, second = first[pinched], second[pinched]
+        following[first], following[second] = following[second], following[first].copy()
+        sequence, ring_start = _walk_rings(following.tolist())
+
+    # only keep the edges where the boundary changes direction
+    previous = np.empty(len(edges), dtype=np.int64)
+    previous[following] = np.arange(len(edges))
+    corner = np.any(direction != direction[previous], axis=1)[sequence]
+    ring_number = np.repeat(np.arange(len(ring_start)), np.diff(ring_start + [len(sequence)]))
+    area = np.bincount(ring_number, weights=edges[sequence, 0] * edges[sequence, 3] - edges[sequence, 2] *
+                       edges[sequence, 1], minlength=len(ring_start))
+    rings = np.split(edges[np.array(sequence)[corner], :2], np.cumsum(np.bincount(ring_number[corner]))[:-1])
+    rings = [np.vstack((ring, ring[:1])) for ring in rings]
+
+    shells = [number for number in range(len(rings)) if area[number] > 0]
+    polygons = {number: [rings[number]] for number in shells}
+    shell_boxes = np.array([np.concatenate((np.min(rings[shell], axis=0), np.max(rings[shell], axis=0)))
+                            for shell in shells])
+    for number in range(len(rings)):
+        if area[number] > 0:
+            continue
+        elif len(shells) == 1:
+            polygons[shells[0]].append(rings[number])
+            continue
+        # centre of the filled cell on the left of the hole's first edge, in lattice coordinates
+        hole = rings[number]
+        step = np.sign(hole[1] - hole[0])
+        point = hole[0] + (step + np.array([-step[1], step[0]])) / 2
+        nearby = np.nonzero(np.all((shell_boxes[:, :2] < point) & (point < shell_boxes[:, 2:]), axis=1))[0]
+        containing = [(area[shells[shell]], shells[shell]) for shell in nearby
+                      if _inside_ring(point, rings[shells[shell]])]
+        polygons[min(containing)[1]].append(hole)
+
+    polygons = [Polygon(np.column_stack((xs[rings[0][:, 0]], ys[rings[0][:, 1]])) * database_unit,
+                        [np.column_stack((xs[ring[:, 0]], ys[ring[:, 1]])) * database_unit for ring in rings[1:]])
+                for rings in polygons.values()]
+    result = polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+    if not result.is_valid:
+        # should not happen, but never hand back invalid geometry, the rectangles of the grid cover the same area
+        warnings.warn('manhattan trace gave invalid geometry, rebuilt from rectangles with shapely instead')
+        rectangles = _manhattan_rectangles(grid, xs, ys) * database_unit
+        result = unary_union([Polygon([(x0, y0), (x1, y0), (x1, y1), (x0, y1)]) for x0, y0, x1, y1 in rectangles])
+    return result
+
+
+def _walk_rings(following):
+    """
+    follows the next edge of every edge until each ring is closed, visiting every edge once.
+    returns the edges in ring order and the position in that order where each ring starts.
+    """
+    sequence, ring_start = [], []
+    visited = [False] * len(following)
+    for first in range(len(following)):
+        if not visited[first]:
+            ring_start.append(len(sequence))
+            edge = first
+            while not visited[edge]:
+                visited[edge] = True
+                sequence.append(edge)
+                edge = following[edge]
+    return sequence, ring_start
+
+
+def _inside_ring(point, ring):
+    """
+    even-odd test of a point against a closed rectilinear ring.
+    """
+    start, end = ring[:-1], ring[1:]
+    crossing = (start[:, 0] == end[:, 0]) & (start[:, 0] > point[0]) & \
+               ((start[:, 1] > point[1]) != (end[:, 1] > point[1]))
+    return np.count_nonzero(crossing) % 2 == 1
+
+
+def manhattan_union(geometries, database_unit=DATABASE_UNIT):
+    """
+    geometric union of rectilinear (Manhattan) geometry using NumPy on the database grid instead of GEOS.
+    use iop.is_manhattan to check the geometry first. this is for when the result has to be exact on the database grid,
+    as in iop.alignment_overlay with mitre corners, it is not a faster union: shapely's unary_union is quicker.
+    the engine works on a grid with one cell per pair of unique x and y coordinates, so time and memory grow with
+    their product, keep to marker-sized inputs.
+
+    :param geometries: list of Manhattan shapely objects
+    :param database_unit: grid the geometry is snapped to, the result is exact on this grid
+    :return: shapely Polygon or MultiPolygon of the union
+    """
+    rings = _manhattan_rings(geometries, database_unit)
+    if rings is None:
+        raise ValueError('manhattan_union only supports polygons with horizontal and vertical edges \n')
+    xs, ys = _manhattan_coordinates(rings)
+    return _manhattan_trace(_manhattan_grid(rings, xs, ys), xs, ys, database_unit)
+
+
+def manhattan_difference(geometry, other, database_unit=DATABASE_UNIT):
+    """
+    geometric difference (geometry - other) of rectilinear (Manhattan) geometry using NumPy on the database grid.
+    exact on the database grid but not faster than shapely, see iop.manhattan_union.
+
+    :param geometry: Manhattan shapely object to subtract from
+    :param other: Manhattan shapely object that is subtracted
+    :param database_unit: grid the geometry is snapped to, the result is exact on this grid
+    :return: shapely Polygon or MultiPolygon of the difference
+    """
+    rings = _manhattan_rings([geometry], database_unit)
+    other_rings = _manhattan_rings([other], database_unit)
+    if rings is None or other_rings is None:
+        raise ValueError('manhattan_difference only supports polygons with horizontal and vertical edges \n')
+    xs, ys = _manhattan_coordinates(rings, other_rings)
+    grid = _manhattan_grid(rings, xs, ys) & ~_manhattan_grid(other_rings, xs, ys)
+    return _manhattan_trace(grid, xs, ys, database_unit)
+
+
+def _manhattan_grow(rings, distance):
+    """
+    grows oriented integer rings by an integer distance with square corners, returned as rectangle rings.
+    the union of the rectangles of the shape, each grown by distance, is the grown shape.
+    """
+    xs, ys = _manhattan_coordinates(rings)
+    rectangles = _manhattan_rectangles(_manhattan_grid(rings, xs, ys), xs, ys)
+    return _rectangle_rings(rectangles + np.array([-distance, -distance, distance, distance]))
+
+
+def manhattan_buffer(geometry, distance, database_unit=DATABASE_UNIT):
+    """
+    grows (positive distance) or shrinks (negative distance) rectilinear (Manhattan) geometry with square corners,
+    the same as a shapely buffer with join_style=2 (mitre), using NumPy on the database grid.
+    exact on the database grid but not faster than shapely, see iop.manhattan_union.
+
+    :param geometry: Manhattan shapely object
+    :param distance: distance to grow by, negative to shrink, snapped to the database grid
+    :param database_unit: grid the geometry is snapped to, the result is exact on this grid
+    :return: shapely Polygon or MultiPolygon of the grown or shrunk geometry
+    """
+    rings = _manhattan_rings([geometry], database_unit)
+    if rings is None:
+        raise ValueError('manhattan_buffer only supports polygons with horizontal and vertical edges \n')
+    distance = int(np.rint(distance / database_unit))
+    if len(rings) == 0 or distance == 0:
+        xs, ys = _manhattan_coordinates(rings)
+        return _manhattan_trace(_manhattan_grid(rings, xs, ys), xs, ys, database_unit)
+
+    if distance > 0:
+        grown = _manhattan_grow(rings, distance)
+        xs, ys = _manhattan_coordinates(grown)
+        return _manhattan_trace(_manhattan_grid(grown, xs, ys), xs, ys, database_unit)
+
+    # shrinking is growing the space around the shape, then taking that away from the shape
+    points = np.concatenate(rings)
+    frame = np.concatenate((np.min(points, axis=0) + 2 * distance, np.max(points, axis=0) - 2 * distance))
+    surrounding = _manhattan_grow(_rectangle_rings(frame[None, :]) + [ring[::-1] for ring in rings], -distance)
+    xs, ys = _manhattan_coordinates(rings, surrounding)
+    grid = _manhattan_grid(rings, xs, ys) & ~_manhattan_grid(surrounding, xs, ys)
+    return _manhattan_trace(grid, xs, ys, database_unit)
+
+
+def _simplified_rings(geometry, database_unit=DATABASE_UNIT):
+    """
+    integer rings of a Polygon or MultiPolygon snapped to the database grid, without repeated or collinear vertices.
+    """
+    rings = []
+    for ring in _ring_arrays(geometry):
+        ring = np.rint(ring[:-1] / database_unit).astype(np.int64)
+        for repeat in range(0, 2):  # dropping a vertex can leave its neighbours collinear, a second pass catches those
+            if len(ring) < 3:
+                break
+            before, after = ring - np.roll(ring, 1, axis=0), np.roll(ring, -1, axis=0) - ring
+            ring = ring[before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0] != 0]
+        if len(ring) >= 3:
+            rings.append(ring)
+    return rings
+
+
+def _slab_trapezoids(rings):
+    """
+    fractures integer rings into trapezoids with horizontal parallel sides. the shape is cut into slabs at the height of
+    every vertex, and a trapezoid is only ended when one of its two sides stops, so a trapezoid bounded by the same two
+    edges through many slabs is one shot. returns an nx4x2 array of trapezoid corners and the number of slab pieces
+    before merging, which is the shot count of a plain scanline fracture.
+    """
+    start = np.concatenate([ring for ring in rings])
+    end = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings])
+    sloped = start[:, 1] != end[:, 1]
+    start, end = start[sloped], end[sloped]
+    flip = start[:, 1] > end[:, 1]
+    start[flip], end[flip] = end[flip], start[flip].copy()
+    ys = np.unique(np.concatenate((start[:, 1], end[:, 1])))
+
+    def x_at(edges, y):
+        return start[edges, 0] + (y - start[edges, 1]) * (end[edges, 0] - start[edges, 0]) / \
+            (end[edges, 1] - start[edges, 1])
+
+    trapezoids = []
+    pieces = 0
+    open_trapezoids = {}
+    for bottom, top in zip(ys[:-1], ys[1:]):
+        active = np.nonzero((start[:, 1] <= bottom) & (end[:, 1] >= top))[0]
+        active = active[np.argsort(x_at(active, (bottom + top) / 2), kind='stable')]
+        pairs = list(zip(active[0::2].tolist(), active[1::2].tolist()))
+        pieces += len(pairs)
+
+        for pair in list(open_trapezoids.keys()):
+            if pair not in pairs:
+                trapezoids.append((pair, open_trapezoids.pop(pair), bottom))
+        for pair in pairs:
+            open_trapezoids.setdefault(pair, bottom)
+    trapezoids += [(pair, first, ys[-1]) for pair, first in open_trapezoids.items()]
+
+    corners = np.empty((len(trapezoids), 4, 2))
+    for number, ((left, right), bottom, top) in enumerate(trapezoids):
+        corners[number] = [(x_at(left, bottom), bottom), (x_at(right, bottom), bottom),
+                           (x_at(right, top), top), (x_at(left, top), top)]
+    return corners, pieces
+
+
+def fracture_geometry(geometry, database_unit=DATABASE_UNIT):
+    """
+    fractures a shapely object into rectangles and trapezoids for an e-beam writer, trying to keep the number of
+    shots low. trapezoids have horizontal parallel sides and run as far as both of their sides do, rectilinear
+    geometry is also fractured with vertical cuts and whichever gives fewer rectangles is kept.
+    use as cell.add_to_layer(layer, *iop.fracture_geometry(shape)) when the geometry is generated,
+    or iop.fracture_cell as a post-pass over a cell. vertices are snapped to the database grid.
+
+    :param geometry: shapely Polygon or MultiPolygon
+    :param database_unit: grid the corners of the trapezoids are snapped to
+    :return: list containing the list of trapezoid Polygons, the number of slabs a plain scanline fracture would
+    give (for comparison, not a count taken from the input) and the shot count of the trapezoids,
+    in the form [trapezoids, scanline_shots, shots]
+    """
+    rings = _simplified_rings(geometry, database_unit)
+    if len(rings) == 0:
+        return [], 0, 0
+
+    corners, pieces = _slab_trapezoids(rings)
+    if _manhattan_rings([geometry], database_unit) is not None:
+        transposed, transposed_pieces = _slab_trapezoids([ring[:, ::-1] for ring in rings])
+        if len(transposed) < len(corners):
+            corners, pieces = transposed[:, ::-1, ::-1], transposed_pieces
+
+    corners = np.rint(corners) * database_unit
+    trapezoids = [Polygon(corner) for corner in corners]
+    return trapezoids, pieces, len(trapezoids)
+
+
+def fracture_cell(cell, layers=None, database_unit=DATABASE_UNIT):
+    """
+    post-pass over a cell that replaces every polygon on the given layers with the trapezoids of
+    iop.fracture_geometry, so they are written to file as separate shots. geometry that isn't polygonal is left as is.
+    child cells (e.g. the sub-cells of iop.instance_duplicates) are fractured too, each unique child cell only once,
+    and their shots are counted once per reference as that is how often the writer exposes them.
+
+    :param cell: the gdshelpers cell to fracture, modified in place along with its child cells
+    :param layers: optional list of layers to fracture, all layers if None
+    :param database_unit: grid the corners of the trapezoids are snapped to
+    :return: dictionary of the total number of slabs a plain scanline fracture would give (for comparison) and of the
+    shots after fracturing, and the same counts per layer,
+    in the form {'scanline_shots': a, 'shots': b, 'layers': {layer: (a, b)}}
+    """
+    counts = {}  # id of every cell fractured so far: its counts per layer, children included
+
+    def fracture_tree(tree_cell):
+        if id(tree_cell) not in counts:
+            tree_counts = _fracture_layers(tree_cell, layers, database_unit)
+            for child in tree_cell.cells:
+                copies = child['columns'] * child['rows']
+                for layer, (scanline_shots, shots) in fracture_tree(child['cell']).items():
+                    previous = tree_counts.get(layer, (0, 0))
+                    tree_counts[layer] = (previous[0] + scanline_shots * copies, previous[1] + shots * copies)
+            counts[id(tree_cell)] = tree_counts
+        return counts[id(tree_cell)]
+
+    layer_counts = fracture_tree(cell)
+    return {'scanline_shots': sum(count[0] for count in layer_counts.values()),
+            'shots': sum(count[1] for count in layer_counts.values()),
+            'layers': layer_counts}
+
+
+def _fracture_layers(cell, layers=None, database_unit=DATABASE_UNIT):
+    """
+    fractures the polygons in cell.layer_dict (not its children) for iop.fracture_cell,
+    returns {layer: (scanline_shots, shots)}.
+    """
+    layer_counts = {}
+    for layer in (list(cell.layer_dict.keys()) if layers is None else layers):
+        fractured = []
+        scanline_shots, shots = 0, 0
+        for geometry in cell.layer_dict.get(layer, []):
+            shape = geometry.get_shapely_object() if hasattr(geometry, 'get_shapely_object') else geometry
+            if getattr(shape, 'geom_type', None) not in ('Polygon', 'MultiPolygon'):
+                fractured.append(geometry)
+                continue
+            trapezoids, slabs, pieces = fracture_geometry(shape, database_unit)
+            fractured += trapezoids
+            scanline_shots += slabs
+            shots += pieces
+
+        if layer in cell.layer_dict:
+            cell.layer_dict[layer] = fractured
+        layer_counts[layer] = (scanline_shots, shots)
+
+    cell._bounds = None  # layer_dict was changed directly, so the cached gdshelpers bounds are no longer valid
+    if hasattr(cell, 'layer_bounds'):
+        track_bounds(cell, rescan=True)
+    return layer_counts
+
+
 def _cell_alignment_points(cell_to_copy):
     """
     incomplete function, recommended to not use as not operating as intended and subject to abrupt changes.